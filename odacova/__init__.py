@@ -1,7 +1,104 @@
-import json
+from __future__ import annotations
+
 import aiohttp
 import asyncio
-from typing import Dict, Any, List, Optional, Union
+import logging
+import orjson
+import random
+import socket
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_MAX_RETRIES = 3
+_RETRY_BASE_DELAY = 0.5
+_RETRY_MAX_DELAY = 30.0
+
+_sessions: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[int, aiohttp.ClientSession]] = weakref.WeakKeyDictionary()
+_session_users: dict[aiohttp.ClientSession, int] = {}
+
+async def _get_session(family: int = socket.AF_UNSPEC) -> aiohttp.ClientSession:
+    """Return the client session shared by every Odacova instance on the running event loop for an address family."""
+    loop = asyncio.get_running_loop()
+    for stale_loop in [other for other in list(_sessions) if other.is_closed()]:
+        # The loop is gone, so its connector has nothing left to run on; closing only marks it closed.
+        for stale in _sessions.pop(stale_loop).values():
+            _session_users.pop(stale, None)
+            await stale.close()
+    sessions = _sessions.setdefault(loop, {})
+    session = sessions.get(family)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            family=family,
+            limit=100, limit_per_host=10,
+            ttl_dns_cache=300, enable_cleanup_closed=True,
+            keepalive_timeout=330,
+        )
+        # Clients with different tokens share this session, so cookies must not carry over between them.
+        session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=60, connect=10),
+        )
+        sessions[family] = session
+    return session
+
+def _release_session(session: aiohttp.ClientSession) -> bool:
+    """Drop one user of a shared session and return True once nobody is using it anymore."""
+    users = _session_users.get(session, 0) - 1
+    if users > 0:
+        _session_users[session] = users
+        return False
+    _session_users.pop(session, None)
+    for sessions in list(_sessions.values()):
+        for family, shared in list(sessions.items()):
+            if shared is session:
+                del sessions[family]
+    return True
+
+def _finalize_session(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop) -> None:
+    """Release a shared session on behalf of a client that was dropped without calling terminate.
+
+    When this was the session's last user it is closed: scheduled on its loop if that loop is running, run to
+    completion if the loop is stopped, and otherwise (closed loop) just marked closed on a throwaway loop.
+    """
+    if not _release_session(session) or session.closed:
+        return
+    if loop.is_running():
+        loop.call_soon_threadsafe(loop.create_task, session.close())
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None:
+        # Collected while another loop runs in this thread, which rules out run_until_complete.
+        running.create_task(session.close())
+    elif not loop.is_closed():
+        loop.run_until_complete(session.close())
+    else:
+        # The connector cannot touch a closed loop, so closing it needs no I/O and any loop can drive it.
+        closer = asyncio.new_event_loop()
+        try:
+            closer.run_until_complete(session.close())
+        finally:
+            closer.close()
+
+def _retry_delay(response: aiohttp.ClientResponse, attempt: int) -> float | None:
+    """Return how long to wait before retrying a throttled or failed request, honouring Retry-After.
+
+    Returns None when Retry-After asks for longer than the client is willing to wait, since retrying any sooner
+    would only be refused again.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            delay = max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        else:
+            return delay if delay <= _RETRY_MAX_DELAY else None
+    return min(_RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, _RETRY_BASE_DELAY), _RETRY_MAX_DELAY)
 
 class Command:
     def __init__(self, name, func):
@@ -19,7 +116,12 @@ class Odacova:
     param bot_token: The authentication token to use when making API requests.
     type bot_token: str
     """
-    def __init__(self, base_url: str, bot_token: str, prefix: str = '/'):
+    __slots__ = (
+        'base_url', 'bot_token', 'session', 'headers', 'latest_message', 'prefix', 'commands',
+        '_family', '_finalizer', '_json_headers', '_poll_interval', '_urls', '__weakref__',
+    )
+
+    def __init__(self, base_url: str, bot_token: str, prefix: str = '/', ipv4_only: bool = False):
         """
         Initialize a new instance of the Odacova client.
 
@@ -27,15 +129,10 @@ class Odacova:
         type base_url: str
         param bot_token: The authentication token to use when making API requests.
         type bot_token: str
+        param ipv4_only: Connect over IPv4 only, skipping dual-stack resolution stalls on hosts with broken IPv6.
+            IPv6-only hosts become unreachable when this is enabled.
+        type ipv4_only: bool
         """
-        self.base_url = base_url
-        self.bot_token = bot_token
-        self.session = aiohttp.ClientSession()
-        self.headers = {'Authorization': f'Bearer {bot_token}'}
-        self.latest_message = None
-        self.prefix = prefix
-        self.commands = {}
-
         if not bot_token:
             raise ValueError('Missing bot token.')
         
@@ -46,7 +143,30 @@ class Odacova:
             raise ValueError('Base URL must start with http or https.')
         
         if not base_url.endswith('/'):
-            self.base_url = f'{base_url}/'
+            base_url = f'{base_url}/'
+
+        self.base_url = base_url
+        self.bot_token = bot_token
+        self.session: aiohttp.ClientSession | None = None
+        self._finalizer: weakref.finalize | None = None
+        self._family = socket.AF_INET if ipv4_only else socket.AF_UNSPEC
+        self.headers = {'Authorization': f'Bearer {bot_token}'}
+        self._json_headers = {**self.headers, 'Content-Type': 'application/json'}
+        self.latest_message = None
+        self._poll_interval = 1.0
+        self.prefix = prefix
+        self.commands = {}
+
+        self._urls = {
+            'events': f'{self.base_url}events',
+            'heartbeat': f'{self.base_url}heartbeat',
+            'channels': f'{self.base_url}channels',
+            'users': f'{self.base_url}users',
+            'bots': f'{self.base_url}bots',
+            'route_bot': f'{self.base_url}route_bot',
+            'chat': f'{self.base_url}chat',
+            'chat_latest': f'{self.base_url}chat?latest=true',
+        }
 
     def command(self, name: str):
         def decorator(func):
@@ -55,25 +175,58 @@ class Odacova:
             return cmd
         return decorator
 
-    async def _handle_response(self, response: aiohttp.ClientResponse)-> Union[Dict[str, Any], None]:
+    async def _acquire_session(self) -> aiohttp.ClientSession:
+        """Return the shared session for the running event loop, registering this client as one of its users."""
+        session = await _get_session(self._family)
+        if session is not self.session:
+            if self._finalizer is not None:
+                self._finalizer()
+            _session_users[session] = _session_users.get(session, 0) + 1
+            self.session = session
+            self._finalizer = weakref.finalize(self, _finalize_session, session, asyncio.get_running_loop())
+        return session
+
+    async def _handle_response(self, response: aiohttp.ClientResponse) -> list | dict | None:
         """
         Handle the response from an API request.
 
         :param response: The response object from the API request.
         :type response: aiohttp.ClientResponse
         :return: The data from the response, or None if there was an error.
-        :rtype: Union[Dict[str, Any], None]
+        :rtype: list | dict | None
         :raises ValueError: If the response contains an error status code.
         """
         try:
             response.raise_for_status()
-            response_text = await response.text()
-            return json.loads(response_text)
-        except (aiohttp.ClientError, json.JSONDecodeError, ValueError) as e:
-            print(f'Error handling response: {e}')
+            raw = await response.read()
+            return orjson.loads(raw)
+        except (aiohttp.ClientError, orjson.JSONDecodeError, ValueError) as e:
+            logger.warning('Error handling response: %s', e)
             return None
 
-    async def get_events(self) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def _request(self, method: str, url: str, **kwargs) -> list | dict | None:
+        """Send a request and return the decoded response, retrying with backoff on 429 and, for GET, on 5xx statuses.
+
+        Other methods are not idempotent and are only retried on 429, where the server rejected them before acting.
+        """
+        retry_server_errors = method == 'GET'
+        session = await self._acquire_session()
+        for attempt in range(_MAX_RETRIES + 1):
+            async with session.request(method, url, **kwargs) as response:
+                status = response.status
+                delay = None
+                if attempt < _MAX_RETRIES and (status == 429 or (retry_server_errors and status >= 500)):
+                    delay = _retry_delay(response, attempt)
+                if delay is None:
+                    return await self._handle_response(response)
+            logger.debug('%s %s returned %s, retrying in %.2fs', method, url, response.status, delay)
+            await asyncio.sleep(delay)
+
+    async def _get(self, endpoint: str) -> list | dict | None:
+        """Send a GET request to one of the known API endpoints and return the decoded response."""
+        return await self._request('GET', self._urls[endpoint], headers=self.headers)
+
+    async def get_events(self) -> list[dict] | None:
         """
         Get a list of events from the API.
 
@@ -82,10 +235,9 @@ class Odacova:
         Raises:
             ValueError: If the token is invalid, the resource is not found, or a server error occurs.
         """
-        async with self.session.get(f'{self.base_url}/events', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._get('events') # type: ignore
 
-    async def get_heartbeat(self) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def get_heartbeat(self) -> list[dict] | None:
         """
         Returns the current state of the bot. This should be called every 5 minutes to keep the bot's connection to the server
         alive. 
@@ -98,10 +250,9 @@ class Odacova:
             ValueError: If the request returns a status code of 404 (resource not found), or if the response cannot be decoded
             into JSON.
         """
-        async with self.session.get(f'{self.base_url}/heartbeat', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._get('heartbeat') # type: ignore
 
-    async def get_channels(self) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def get_channels(self) -> list[dict] | None:
         """
         Returns a list of all channels in the server. 
 
@@ -113,10 +264,9 @@ class Odacova:
             ValueError: If the request returns a status code of 404 (resource not found), or if the response cannot be decoded
             into JSON.
         """
-        async with self.session.get(f'{self.base_url}/channels', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._get('channels') # type: ignore
 
-    async def get_users(self) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def get_users(self) -> list[dict] | None:
         """
         Returns a list of all users in the server. 
 
@@ -128,10 +278,9 @@ class Odacova:
             ValueError: If the request returns a status code of 404 (resource not found), or if the response cannot be decoded
             into JSON.
         """
-        async with self.session.get(f'{self.base_url}/users', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._get('users') # type: ignore
 
-    async def get_bots(self) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def get_bots(self) -> list[dict] | None:
         """
         Returns a list of all bots in the server. 
 
@@ -143,14 +292,23 @@ class Odacova:
             ValueError: If the request returns a status code of 404 (resource not found), or if the response cannot be decoded
             into JSON.
         """
-        async with self.session.get(f'{self.base_url}/bots', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._get('bots') # type: ignore
     
-    async def route_bot(self) -> Optional[Union[List[Dict[str, Any]], None]]:
-        async with self.session.get(f'{self.base_url}/route_bot', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+    async def snapshot(self) -> dict[str, list[dict] | None]:
+        """
+        Returns the channels, users and bots of the server, fetched concurrently.
+
+        Returns:
+            A dictionary with the keys ``channels``, ``users`` and ``bots``, each holding the result of the
+            corresponding getter (None for any request that was unsuccessful).
+        """
+        channels, users, bots = await asyncio.gather(self.get_channels(), self.get_users(), self.get_bots())
+        return {'channels': channels, 'users': users, 'bots': bots}
+
+    async def route_bot(self) -> list[dict] | None:
+        return await self._get('route_bot') # type: ignore
 
-    async def post_message(self, message: str) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def post_message(self, message: str) -> list[dict] | None:
         """Send a message to the server.
         
         Parameters:
@@ -162,10 +320,9 @@ class Odacova:
         """  
         data = {"message": message, "bot_token": self.bot_token}
         
-        async with self.session.post(f'{self.base_url}/chat', headers=self.headers, json=data) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._request('POST', self._urls['chat'], headers=self._json_headers, data=orjson.dumps(data)) # type: ignore
 
-    async def get_message(self) -> Optional[Union[List[Dict[str, Any]], None]]:
+    async def get_message(self) -> list[dict] | None:
         """Get a message from the server.
         
         Parameters:
@@ -175,36 +332,55 @@ class Odacova:
         user : str
             The user to send the message to. If None, the message is sent to the server.
         """  
-        async with self.session.get(f'{self.base_url}/chat', headers=self.headers) as response:
-            return await self._handle_response(response) # type: ignore
+        return await self._get('chat') # type: ignore
     
     async def terminate(self):
-        """Close the client session and frees memory."""
-        await self.session.close()
+        """Release the shared client session, closing it once no other client uses it. Safe to call more than once."""
+        session, self.session = self.session, None
+        if session is None:
+            return
+        self._finalizer.detach()
+        self._finalizer = None
+        if _release_session(session) and not session.closed:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.terminate()
 
     async def on_message(self):
-        async with self.session.get(f'{self.base_url}/chat?latest=true', headers=self.headers) as resp:
-            if resp.status == 200:
-                chat = await resp.json()
+        """Poll the chat and yield ``(message, user)`` for every new prefixed message.
 
-                if chat and chat[-1]['message'] != self.latest_message:
-                    self.latest_message = chat[-1]['message']
-                    #yield chat[-1]['message'], chat[-1]['user']
-                    message = chat[-1]['message']
-                    user = chat[-1]['user']
-                    if message.startswith(self.prefix):
-                        yield message, user
+        The poll interval backs off while the chat is idle and resets as soon as a new message arrives.
+        """
+        get = self._get
+        while True:
+            chat = await get('chat_latest')
 
-        await asyncio.sleep(3)
+            if chat and chat[-1]['message'] != self.latest_message:
+                self._poll_interval = 1.0
+                latest = chat[-1]
+                message = latest['message']
+                self.latest_message = message
+                user = latest['user']
+                if message.startswith(self.prefix):
+                    yield message, user
+            else:
+                self._poll_interval = min(self._poll_interval * 1.5, 30.0)
+
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self._poll_interval)
 
     async def on_command(self, prefix):
-        async with self.session.get(f'{self.base_url}/chat?latest=true', headers=self.headers) as resp:
-            if resp.status == 200:
-                chat = await resp.json()
-
-                if chat and chat[-1]['message'] != self.latest_message:
-                    self.latest_message = chat[-1]['message']
-                    message, user = chat[-1]['message'], chat[-1]['user']
-                    if message.startswith(prefix):
-                        command = message[len(prefix):].strip()
-                        yield command, user
+        chat = await self._get('chat_latest')
+
+        if chat:
+            latest = chat[-1]
+            message = latest['message']
+            if message != self.latest_message:
+                self.latest_message = message
+                user = latest['user']
+                if message.startswith(prefix):
+                    command = message[len(prefix):].strip()
+                    yield command, user
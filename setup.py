@@ -4,10 +4,9 @@ setup(
     name='odacova.py',
     version='0.1.3',
     packages=find_packages(),
+    python_requires='>=3.8',
     install_requires=[
-        'requests',
-        'typing',
-        'asyncio',
-        'aiohttp',
+        'aiohttp>=3.8',
+        'orjson',
     ],
 )
\ No newline at end of file
@@ -0,0 +1,68 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import odacova
+from odacova import Odacova
+
+
+def _serve(monkeypatch, method, statuses, headers=None):
+    """Run a request against a local server answering with ``statuses`` in turn and return (result, calls)."""
+    monkeypatch.setattr(odacova, '_RETRY_BASE_DELAY', 0.0)
+    calls = []
+
+    async def chat(request):
+        calls.append(await request.read())
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if status != 200:
+            return web.Response(status=status, headers=headers)
+        return web.json_response([{'message': 'hi', 'user': 'u'}])
+
+    async def main():
+        app = web.Application()
+        app.router.add_route(method, '/chat', chat)
+        async with TestServer(app, host='127.0.0.1') as server:
+            async with Odacova(str(server.make_url('/')), 'token') as bot:
+                if method == 'GET':
+                    return await bot.get_message()
+                return await bot.post_message('x')
+
+    return asyncio.run(main()), calls
+
+
+def test_get_retries_server_errors(monkeypatch):
+    result, calls = _serve(monkeypatch, 'GET', [503, 500, 200])
+    assert result == [{'message': 'hi', 'user': 'u'}]
+    assert len(calls) == 3
+
+
+def test_get_gives_up_after_max_retries(monkeypatch):
+    result, calls = _serve(monkeypatch, 'GET', [500])
+    assert result is None
+    assert len(calls) == odacova._MAX_RETRIES + 1
+
+
+def test_post_is_not_retried_on_server_error(monkeypatch):
+    result, calls = _serve(monkeypatch, 'POST', [500, 200])
+    assert result is None
+    assert len(calls) == 1
+
+
+def test_post_is_retried_on_rate_limit(monkeypatch):
+    result, calls = _serve(monkeypatch, 'POST', [429, 200], headers={'Retry-After': '0'})
+    assert result == [{'message': 'hi', 'user': 'u'}]
+    assert len(calls) == 2
+    assert calls[0] == calls[1]
+
+
+
+def test_retry_after_beyond_the_cap_is_not_retried(monkeypatch):
+    result, calls = _serve(monkeypatch, 'GET', [429, 200], headers={'Retry-After': '120'})
+    assert result is None
+    assert len(calls) == 1
+
+def test_client_errors_are_not_retried(monkeypatch):
+    result, calls = _serve(monkeypatch, 'GET', [404, 200])
+    assert result is None
+    assert len(calls) == 1
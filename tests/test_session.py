@@ -0,0 +1,169 @@
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import odacova
+from odacova import Odacova
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serves GET /chat and leaves a pooled keep-alive connection behind in the client's connector.
+_PREAMBLE = '''
+import asyncio, gc
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from odacova import Odacova
+
+async def chat(request):
+    return web.json_response([])
+
+async def poll(bot):
+    app = web.Application()
+    app.router.add_get('/chat', chat)
+    async with TestServer(app, host='127.0.0.1') as server:
+        bot._urls['chat'] = str(server.make_url('/chat'))
+        await bot.get_message()
+'''
+
+
+def test_clients_do_not_share_cookies():
+    async def chat(request):
+        response = web.json_response({'cookie': request.headers.get('Cookie')})
+        response.set_cookie('sid', request.headers['Authorization'])
+        return response
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/chat', chat)
+        async with TestServer(app, host='127.0.0.1') as server:
+            # The default cookie jar ignores IP hosts, so go through a hostname.
+            url = f'http://localhost:{server.port}'
+            async with Odacova(url, 'tokenA') as a, Odacova(url, 'tokenB') as b:
+                return await a.get_message(), await b.get_message()
+
+    assert asyncio.run(main()) == ({'cookie': None}, {'cookie': None})
+
+
+def test_session_is_shared_and_closed_by_its_last_user():
+    async def main():
+        a, b = Odacova('http://x', 'a'), Odacova('http://x', 'b')
+        session = await a._acquire_session()
+        assert await b._acquire_session() is session
+        assert odacova._session_users[session] == 2
+
+        await a.terminate()
+        await a.terminate()
+        assert not session.closed
+        assert odacova._session_users[session] == 1
+
+        await b.terminate()
+        assert session.closed
+        assert session not in odacova._session_users
+        assert odacova._sessions[asyncio.get_running_loop()] == {}
+
+    asyncio.run(main())
+
+
+def test_address_families_get_separate_sessions():
+    async def main():
+        async with Odacova('http://x', 'a') as a, Odacova('http://x', 'b', ipv4_only=True) as b:
+            assert await a._acquire_session() is not await b._acquire_session()
+
+    asyncio.run(main())
+
+
+def test_sessions_of_closed_loops_are_purged():
+    bot = Odacova('http://x', 'token')
+
+    async def acquire():
+        return await bot._acquire_session()
+
+    first = asyncio.run(acquire())
+    assert not first.closed
+
+    async def reacquire():
+        second = await bot._acquire_session()
+        assert first.closed
+        assert first not in odacova._session_users
+        assert all(not loop.is_closed() for loop in odacova._sessions)
+        assert second is not first
+        await bot.terminate()
+
+    asyncio.run(reacquire())
+
+
+def _run_dev(source):
+    """Run ``source`` after the preamble in a ``-X dev`` interpreter and return its stderr."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'dev', '-c', _PREAMBLE + textwrap.dedent(source)],
+        cwd=ROOT, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert 'Unclosed client session' not in result.stderr
+    assert 'Unclosed connector' not in result.stderr
+    assert 'exception was never retrieved' not in result.stderr
+    return result.stdout
+
+
+def test_client_dropped_while_loop_runs_closes_session():
+    stdout = _run_dev("""
+        async def main():
+            bot = Odacova('http://x', 'token')
+            await poll(bot)
+            session = bot.session
+            del bot
+            gc.collect()
+            for _ in range(5):
+                await asyncio.sleep(0)
+            print(session.closed)
+
+        asyncio.run(main())
+    """)
+    assert stdout.strip() == 'True'
+
+
+def test_client_left_open_after_asyncio_run_is_closed_at_exit():
+    _run_dev("""
+        bot = Odacova('http://x', 'token')
+        asyncio.run(poll(bot))
+    """)
+
+
+def test_client_dropped_after_loop_stopped_closes_session():
+    stdout = _run_dev("""
+        loop = asyncio.new_event_loop()
+        bot = Odacova('http://x', 'token')
+        loop.run_until_complete(poll(bot))
+        session = bot.session
+        del bot
+        gc.collect()
+        print(session.closed)
+        loop.close()
+    """)
+    assert stdout.strip() == 'True'
+
+
+def test_client_dropped_while_another_loop_runs_closes_session():
+    stdout = _run_dev("""
+        loop = asyncio.new_event_loop()
+        bot = Odacova('http://x', 'token')
+        loop.run_until_complete(poll(bot))
+        session = bot.session
+
+        async def drop():
+            global bot
+            bot = None
+            gc.collect()
+            for _ in range(5):
+                await asyncio.sleep(0)
+            print(session.closed)
+
+        asyncio.run(drop())
+        loop.close()
+    """)
+    assert stdout.strip() == 'True'